@@ -1,6 +1,8 @@
+from collections.abc import Iterable
 from datetime import datetime
+from typing import Literal, overload
 
-from python_snoo.containers import Activity, BabyData, BreastfeedingActivity, DiaperActivity, DiaperTypes
+from python_snoo.containers import ACTIVITY_DECODERS, Activity, BabyData, DiaperActivity, DiaperTypes
 from python_snoo.exceptions import SnooBabyError
 from python_snoo.snoo import Snoo
 
@@ -25,16 +27,59 @@ class Baby:
             raise SnooBabyError from ex
         return BabyData.from_dict(resp)
 
-    async def get_activity_data(self, from_date: datetime, to_date: datetime) -> list[Activity]:
+    @overload
+    async def get_activity_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        types: str | Iterable[str] | None = ...,
+        include_unknown: Literal[False] = ...,
+    ) -> list[Activity]: ...
+
+    @overload
+    async def get_activity_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        types: str | Iterable[str] | None = ...,
+        *,
+        include_unknown: Literal[True],
+    ) -> list[Activity | dict]: ...
+
+    @overload
+    async def get_activity_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        types: str | Iterable[str] | None,
+        include_unknown: Literal[True],
+    ) -> list[Activity | dict]: ...
+
+    async def get_activity_data(
+        self,
+        from_date: datetime,
+        to_date: datetime,
+        types: str | Iterable[str] | None = None,
+        include_unknown: bool = False,
+    ) -> list[Activity] | list[Activity | dict]:
         """Get activity data for this baby including feeding and diaper changes
 
         Args:
             from_date: Start date for activity range
             to_date: End date for activity range
+            types: Only return these activity types, e.g. ['diaper'], or a single type
+                such as 'diaper'. Other items are dropped before they are decoded.
+                Defaults to all types.
+            include_unknown: Return items with no registered decoder as raw dicts
+                instead of skipping them.
 
         Returns:
-            List of typed Activity objects (DiaperActivity or BreastfeedingActivity)
+            List of typed Activity objects (DiaperActivity or BreastfeedingActivity),
+            plus raw dicts for unknown types if include_unknown is set
         """
+        if isinstance(types, str):
+            types = [types]
+        wanted = {t.lower() for t in types} if types is not None else None
         hdrs = self.snoo.generate_snoo_auth_headers(self.snoo.tokens.aws_id)
 
         url = f"{self.activity_base_url}/babies/{self.baby_id}/journals/grouped-tracking"
@@ -51,18 +96,19 @@ class Baby:
             if r.status < 200 or r.status >= 300:
                 raise SnooBabyError(f"Failed to get activity data: {r.status}: {resp}. Payload: {params}")
 
-            activities: list[Activity] = []
+            activities: list[Activity | dict] = []
             if isinstance(resp, list):
                 for activity in resp:
                     activity_type = activity.get("type", "").lower()
-
-                    if activity_type == "diaper":
-                        activities.append(DiaperActivity.from_dict(activity))
-                    elif activity_type == "breastfeeding":
-                        activities.append(BreastfeedingActivity.from_dict(activity))
-                    else:
-                        # Other activity types exist but aren't supported yet
-                        raise SnooBabyError(f"Unknown activity type: {activity_type}")
+                    if wanted is not None and activity_type not in wanted:
+                        continue
+
+                    decoder = ACTIVITY_DECODERS.get(activity_type)
+                    if decoder is not None:
+                        activities.append(decoder.from_dict(activity))
+                    elif include_unknown:
+                        activities.append(activity)
+                    # Other activity types exist but aren't supported yet, so they are skipped
             else:
                 raise SnooBabyError(f"Unexpected response format: {type(resp)}")
 
@@ -1,4 +1,4 @@
-from enum import StrEnum
+from enum import IntEnum, StrEnum
 
 
 class SnooCommand(StrEnum):
@@ -8,3 +8,31 @@ class SnooCommand(StrEnum):
     SET_STICKY_WHITE_NOISE = "set_sticky_white_noise"
     SEND_STATUS = "send_status"
     CUSTOM_GET_HISTORY = "custom_get_history"
+
+
+class CommandPriority(IntEnum):
+    """Outgoing command classes; lower values are sent first."""
+
+    URGENT = 0
+    CONTROL = 1
+    ROUTINE = 2
+
+
+COMMAND_PRIORITIES: dict[str, CommandPriority] = {
+    SnooCommand.START_SNOO: CommandPriority.CONTROL,
+    SnooCommand.GO_TO_STATE: CommandPriority.CONTROL,
+    SnooCommand.SET_WEANING: CommandPriority.CONTROL,
+    SnooCommand.SET_STICKY_WHITE_NOISE: CommandPriority.CONTROL,
+    SnooCommand.SEND_STATUS: CommandPriority.ROUTINE,
+    SnooCommand.CUSTOM_GET_HISTORY: CommandPriority.ROUTINE,
+}
+
+
+def command_priority(command: str, **kwargs) -> CommandPriority:
+    """Return the default priority for ``command`` sent with ``kwargs``.
+
+    Going to the ONLINE state stops the Snoo, so it is urgent however it is requested.
+    """
+    if command == SnooCommand.GO_TO_STATE and kwargs.get("state") == "ONLINE":
+        return CommandPriority.URGENT
+    return COMMAND_PRIORITIES.get(command, CommandPriority.CONTROL)
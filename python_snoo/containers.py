@@ -211,3 +211,14 @@ class BreastfeedingActivity(DataClassJSONMixin):
 
 
 Activity = Union[DiaperActivity, BreastfeedingActivity]
+
+# Decoders for journal activity types, keyed by the lowercase "type" the API returns.
+ACTIVITY_DECODERS: dict[str, type[DataClassJSONMixin]] = {
+    "diaper": DiaperActivity,
+    "breastfeeding": BreastfeedingActivity,
+}
+
+
+def register_activity_decoder(activity_type: str, decoder: type[DataClassJSONMixin]) -> None:
+    """Decode activities of ``activity_type`` with ``decoder`` in Baby.get_activity_data."""
+    ACTIVITY_DECODERS[activity_type.lower()] = decoder
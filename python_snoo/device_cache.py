@@ -0,0 +1,95 @@
+"""Persist the device list so subscriptions can start before get_devices returns."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .containers import SnooDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+
+
+@dataclasses.dataclass
+class DeviceChanges:
+    added: list[SnooDevice] = dataclasses.field(default_factory=list)
+    removed: list[SnooDevice] = dataclasses.field(default_factory=list)
+    moved: list[SnooDevice] = dataclasses.field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.moved)
+
+
+def devices_version(devices: list[SnooDevice]) -> str:
+    """A stamp that changes whenever any field of any device changes."""
+    payload = json.dumps(
+        sorted((device.to_dict() for device in devices), key=lambda d: d["serialNumber"]),
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _endpoint(device: SnooDevice) -> tuple[str, str] | None:
+    if device.awsIoT is None:
+        return None
+    return device.awsIoT.clientEndpoint, device.awsIoT.thingName
+
+
+def diff_devices(old: list[SnooDevice], new: list[SnooDevice]) -> DeviceChanges:
+    """Compare two device lists by serial number; ``moved`` holds devices with a new MQTT endpoint."""
+    old_by_sn = {device.serialNumber: device for device in old}
+    new_by_sn = {device.serialNumber: device for device in new}
+    return DeviceChanges(
+        added=[device for sn, device in new_by_sn.items() if sn not in old_by_sn],
+        removed=[device for sn, device in old_by_sn.items() if sn not in new_by_sn],
+        moved=[
+            device
+            for sn, device in new_by_sn.items()
+            if sn in old_by_sn and _endpoint(device) != _endpoint(old_by_sn[sn])
+        ],
+    )
+
+
+class DeviceCache:
+    """A JSON file holding the last device list and its version stamp.
+
+    These methods do blocking file I/O; Snoo calls them through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> tuple[str, list[SnooDevice]] | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != CACHE_FORMAT:
+                return None
+            return data["version"], [SnooDevice.from_dict(device) for device in data["devices"]]
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _LOGGER.warning(f"Ignoring unreadable device cache at {self.path}", exc_info=True)
+            return None
+
+    def save(self, devices: list[SnooDevice]) -> str:
+        version = devices_version(devices)
+        data = {
+            "format": CACHE_FORMAT,
+            "version": version,
+            "saved_at": time.time(),
+            "devices": [device.to_dict() for device in devices],
+        }
+        # Write to a temporary file first so a crash never leaves a truncated cache.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        return version
@@ -0,0 +1,224 @@
+"""Stream activity and state history into columnar files.
+
+Parquet and Arrow IPC output need ``pyarrow``; without it datasets are written as CSV.
+"""
+
+from __future__ import annotations
+
+import csv
+import dataclasses
+import datetime
+import json
+import os
+import re
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
+from .exceptions import SnooException
+from .history import SnooDataHistory
+
+if TYPE_CHECKING:
+    from .baby import Baby
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+SNOO_DATA_COLUMNS: dict[str, str] = {
+    "event_time_ms": "int64",
+    "event": "string",
+    "system_state": "string",
+    "sw_version": "string",
+    "left_safety_clip": "int32",
+    "right_safety_clip": "int32",
+    "rx_signal": "string",
+    "session_id": "string",
+    "state": "string",
+    "level": "string",
+    "is_active_session": "bool",
+    "since_session_start_ms": "int64",
+    "time_left": "int32",
+    "up_transition": "string",
+    "down_transition": "string",
+    "sticky_white_noise": "string",
+    "weaning": "string",
+    "hold": "string",
+    "audio": "string",
+}
+
+ACTIVITY_COLUMNS: dict[str, str] = {
+    "id": "string",
+    "type": "string",
+    "babyId": "string",
+    "userId": "string",
+    "startTime": "string",
+    "endTime": "string",
+    "createdAt": "string",
+    "updatedAt": "string",
+    "note": "string",
+    "data": "string",
+}
+
+_ARROW_TYPES = {"int32": "int32", "int64": "int64", "bool": "bool_", "string": "string"}
+_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"}
+
+
+def history_rows(history: SnooDataHistory) -> Iterator[dict[str, Any]]:
+    """Yield one flat row per record, reading the history's columns without building SnooData."""
+    strings = history.strings.values
+    string_columns = [name for name, kind in SNOO_DATA_COLUMNS.items() if kind == "string"]
+    codes = {name: history.codes(name) for name in string_columns}
+    for i in range(len(history)):
+        row: dict[str, Any] = {name: strings[codes[name][i]] for name in string_columns}
+        row["level"] = row["level"] or None
+        row["event_time_ms"] = history.event_time_ms[i]
+        row["left_safety_clip"] = history.left_safety_clip[i]
+        row["right_safety_clip"] = history.right_safety_clip[i]
+        row["is_active_session"] = bool(history.is_active_session[i])
+        row["since_session_start_ms"] = history.since_session_start_ms[i]
+        row["time_left"] = history.time_left[i]
+        yield row
+
+
+def activity_row(activity: Any) -> dict[str, Any]:
+    """Flatten a decoded activity, or a raw activity dict, into one row."""
+    item = activity if isinstance(activity, dict) else dataclasses.asdict(activity)
+    row = {name: item.get(name) for name in ACTIVITY_COLUMNS}
+    if row["data"] is not None:
+        row["data"] = json.dumps(row["data"], sort_keys=True, separators=(",", ":"))
+    return row
+
+
+class DatasetWriter:
+    """Write rows to a new part file in ``directory``, ``chunk_rows`` at a time.
+
+    At most ``chunk_rows`` rows are buffered, so memory use stays flat however much is
+    exported. Each writer adds one part file numbered after the existing ones, so running
+    an export again appends to the dataset without rewriting it. ``file_format`` is
+    ``"parquet"``, ``"arrow"`` or ``"csv"``; it defaults to Parquet if pyarrow is installed
+    and CSV otherwise.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        columns: dict[str, str],
+        file_format: str | None = None,
+        chunk_rows: int = 10_000,
+        prefix: str = "part",
+    ) -> None:
+        if file_format is None:
+            file_format = "parquet" if pa is not None else "csv"
+        if file_format not in _EXTENSIONS:
+            raise SnooException(f"Unsupported export format: {file_format}")
+        if file_format != "csv" and pa is None:
+            raise SnooException(f"Writing {file_format} files requires pyarrow")
+        self.directory = directory
+        self.columns = columns
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.prefix = prefix
+        self.path: str | None = None
+        self.rows_written = 0
+        self._buffer: dict[str, list] = {name: [] for name in columns}
+        self._buffered = 0
+        self._writer: Any = None
+        self._file: Any = None
+
+    def _next_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        extension = _EXTENSIONS[self.file_format]
+        pattern = re.compile(rf"{re.escape(self.prefix)}-(\d+)\.{extension}$")
+        numbers = [int(m.group(1)) for m in map(pattern.match, os.listdir(self.directory)) if m]
+        return os.path.join(self.directory, f"{self.prefix}-{max(numbers, default=-1) + 1:05d}.{extension}")
+
+    def _open(self) -> None:
+        self.path = self._next_path()
+        if self.file_format == "csv":
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+            return
+        self._schema = pa.schema([(name, getattr(pa, _ARROW_TYPES[kind])()) for name, kind in self.columns.items()])
+        if self.file_format == "parquet":
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        else:
+            self._file = pa.OSFile(self.path, "wb")
+            self._writer = pa.ipc.new_file(self._file, self._schema)
+
+    def write(self, row: dict[str, Any]) -> None:
+        for name, values in self._buffer.items():
+            values.append(row.get(name))
+        self._buffered += 1
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def write_many(self, rows: Iterable[dict[str, Any]]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+        if self._writer is None:
+            self._open()
+        if self.file_format == "csv":
+            self._writer.writerows(zip(*self._buffer.values()))
+        else:
+            self._writer.write_table(pa.Table.from_pydict(self._buffer, schema=self._schema))
+        self.rows_written += self._buffered
+        self._buffer = {name: [] for name in self.columns}
+        self._buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self._writer is not None and self.file_format != "csv":
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = None
+        self._file = None
+
+    def __enter__(self) -> DatasetWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def export_history(history: SnooDataHistory, directory: str, **kwargs: Any) -> int:
+    """Append a recorded SnooDataHistory to a dataset and return the number of rows written."""
+    with DatasetWriter(directory, SNOO_DATA_COLUMNS, **kwargs) as writer:
+        writer.write_many(history_rows(history))
+    return writer.rows_written
+
+
+async def export_activities(
+    baby: Baby,
+    directory: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    window: datetime.timedelta = datetime.timedelta(days=7),
+    types: str | Iterable[str] | None = None,
+    **kwargs: Any,
+) -> int:
+    """Append a baby's activities to a dataset, fetching ``window`` at a time.
+
+    Only one window of activities is held in memory at once. Unknown activity types are
+    written with their raw data. Returns the number of rows written.
+    """
+    previous_ids: set[str] = set()
+    with DatasetWriter(directory, ACTIVITY_COLUMNS, **kwargs) as writer:
+        start = from_date
+        while start < to_date:
+            end = min(start + window, to_date)
+            activities = await baby.get_activity_data(start, end, types=types, include_unknown=True)
+            rows = [activity_row(activity) for activity in activities]
+            # Activities exactly on a window boundary can be returned by both windows.
+            writer.write_many(row for row in rows if row["id"] not in previous_ids)
+            previous_ids = {row["id"] for row in rows}
+            start = end
+    return writer.rows_written
@@ -0,0 +1,203 @@
+"""Compact, columnar storage for long windows of SnooData."""
+
+from __future__ import annotations
+
+import datetime
+import json
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import overload
+
+from .containers import SnooData, SnooEvents, SnooLevels, SnooStateMachine, SnooStates
+
+_NO_LEVEL = ""
+_NO_TIMESTAMP = -(2**63)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class _StringTable:
+    """Maps repeated strings to small integer codes so each is stored once."""
+
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+
+class SnooDataHistory:
+    """An append-only, array-backed buffer of SnooData for a single device.
+
+    Numeric fields live in typed arrays and every string (including enum values and the
+    ``rx_signal`` dict, stored as canonical JSON) is interned into a shared table, so a
+    record costs roughly a hundred bytes instead of two dataclass instances, a dict and a
+    datetime. Records convert back to SnooData losslessly, including the originally
+    computed ``time_left_timestamp`` and ``level``.
+    """
+
+    _STRING_COLUMNS = (
+        "sw_version",
+        "system_state",
+        "event",
+        "rx_signal",
+        "up_transition",
+        "down_transition",
+        "sticky_white_noise",
+        "weaning",
+        "session_id",
+        "state",
+        "hold",
+        "audio",
+        "level",
+    )
+
+    def __init__(self) -> None:
+        self.strings = _StringTable()
+        self.event_time_ms = array("q")
+        self.since_session_start_ms = array("q")
+        self.time_left = array("i")
+        self.time_left_timestamp_us = array("q")
+        self.left_safety_clip = array("i")
+        self.right_safety_clip = array("i")
+        self.is_active_session = array("b")
+        self._codes: dict[str, array] = {name: array("I") for name in self._STRING_COLUMNS}
+
+    @classmethod
+    def from_iterable(cls, items: Iterable[SnooData]) -> SnooDataHistory:
+        history = cls()
+        history.extend(items)
+        return history
+
+    def append(self, data: SnooData) -> None:
+        sm = data.state_machine
+        self.event_time_ms.append(data.event_time_ms)
+        self.since_session_start_ms.append(sm.since_session_start_ms)
+        self.time_left.append(sm.time_left)
+        self.time_left_timestamp_us.append(
+            (sm.time_left_timestamp - _EPOCH) // _MICROSECOND if sm.time_left_timestamp is not None else _NO_TIMESTAMP
+        )
+        self.left_safety_clip.append(data.left_safety_clip)
+        self.right_safety_clip.append(data.right_safety_clip)
+        self.is_active_session.append(sm.is_active_session)
+
+        code = self.strings.code
+        codes = self._codes
+        codes["sw_version"].append(code(data.sw_version))
+        codes["system_state"].append(code(data.system_state))
+        codes["event"].append(code(data.event.value))
+        codes["rx_signal"].append(code(json.dumps(data.rx_signal, sort_keys=True, separators=(",", ":"))))
+        codes["up_transition"].append(code(sm.up_transition))
+        codes["down_transition"].append(code(sm.down_transition))
+        codes["sticky_white_noise"].append(code(sm.sticky_white_noise))
+        codes["weaning"].append(code(sm.weaning))
+        codes["session_id"].append(code(sm.session_id))
+        codes["state"].append(code(sm.state.value))
+        codes["hold"].append(code(sm.hold))
+        codes["audio"].append(code(sm.audio))
+        codes["level"].append(code(sm.level.value if sm.level is not None else _NO_LEVEL))
+
+    def extend(self, items: Iterable[SnooData]) -> None:
+        for data in items:
+            self.append(data)
+
+    def column(self, name: str) -> array | list[str]:
+        """Return a numeric column as its typed array, or a string column decoded to a list."""
+        if name in self._codes:
+            values = self.strings.values
+            return [values[c] for c in self._codes[name]]
+        column = getattr(self, name, None)
+        if not isinstance(column, array):
+            raise KeyError(name)
+        return column
+
+    def codes(self, name: str) -> array:
+        """Return the interned codes of a string column; decode them with ``self.strings``."""
+        return self._codes[name]
+
+    def _string(self, name: str, index: int) -> str:
+        return self.strings[self._codes[name][index]]
+
+    def _get(self, index: int) -> SnooData:
+        s = self._string
+        state_machine = SnooStateMachine(
+            up_transition=s("up_transition", index),
+            since_session_start_ms=self.since_session_start_ms[index],
+            sticky_white_noise=s("sticky_white_noise", index),
+            weaning=s("weaning", index),
+            time_left=self.time_left[index],
+            session_id=s("session_id", index),
+            state=SnooStates(s("state", index)),
+            is_active_session=bool(self.is_active_session[index]),
+            down_transition=s("down_transition", index),
+            hold=s("hold", index),
+            audio=s("audio", index),
+        )
+        # Restore the values computed when the record was first decoded rather than now.
+        timestamp_us = self.time_left_timestamp_us[index]
+        state_machine.time_left_timestamp = (
+            None if timestamp_us == _NO_TIMESTAMP else _EPOCH + timestamp_us * _MICROSECOND
+        )
+        level = s("level", index)
+        state_machine.level = SnooLevels(level) if level != _NO_LEVEL else None
+        return SnooData(
+            left_safety_clip=self.left_safety_clip[index],
+            rx_signal=json.loads(s("rx_signal", index)),
+            right_safety_clip=self.right_safety_clip[index],
+            sw_version=s("sw_version", index),
+            event_time_ms=self.event_time_ms[index],
+            state_machine=state_machine,
+            system_state=s("system_state", index),
+            event=SnooEvents(s("event", index)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.event_time_ms)
+
+    @overload
+    def __getitem__(self, index: int) -> SnooData: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[SnooData]: ...
+
+    def __getitem__(self, index: int | slice) -> SnooData | list[SnooData]:
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SnooDataHistory index out of range")
+        return self._get(index)
+
+    def __iter__(self) -> Iterator[SnooData]:
+        for index in range(len(self)):
+            yield self._get(index)
+
+    def to_list(self) -> list[SnooData]:
+        return list(self)
+
+    def clear(self) -> None:
+        self.strings = _StringTable()
+        for column in (
+            self.event_time_ms,
+            self.since_session_start_ms,
+            self.time_left,
+            self.time_left_timestamp_us,
+            self.left_safety_clip,
+            self.right_safety_clip,
+            self.is_active_session,
+            *self._codes.values(),
+        ):
+            del column[:]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(records={len(self)}, strings={len(self.strings.values)})"
@@ -0,0 +1,159 @@
+"""Manage many Happiest Baby accounts on one client session."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import random
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from .exceptions import InvalidSnooAuth, SnooAuthException, SnooException
+from .snoo import Snoo
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class PoolMetrics:
+    refreshes: int = 0
+    refresh_failures: int = 0
+    reauthorizations: int = 0
+    reconnects: int = 0
+    reconnect_timeouts: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+@dataclasses.dataclass
+class AccountState:
+    key: str
+    authorized: bool
+    connected_devices: int
+    subscribed_devices: int
+    refresh_in: float | None
+
+
+class SnooPool:
+    """A set of Snoo accounts sharing one aiohttp session and one refresh scheduler.
+
+    Accounts are created with ``auto_reauthorize=False``; the pool refreshes each one a
+    random amount of time within ``spread`` seconds before its ``refresh_margin``, so
+    accounts authorized together don't hit Cognito and the MQTT broker at the same moment.
+    At most ``max_concurrency`` refreshes run at once. Each is followed by a reconnect of
+    that account's subscriptions, and the slot is held until those clients are connected
+    again or ``connect_timeout`` passes.
+    """
+
+    def __init__(
+        self,
+        clientsession: aiohttp.ClientSession,
+        max_concurrency: int = 4,
+        refresh_margin: float = 300,
+        spread: float = 600,
+        retry_delay: float = 60,
+        connect_timeout: float = 30,
+    ) -> None:
+        self.session = clientsession
+        self.refresh_margin = refresh_margin
+        self.spread = spread
+        self.retry_delay = retry_delay
+        self.connect_timeout = connect_timeout
+        self.metrics = PoolMetrics()
+        self.accounts: dict[str, Snoo] = {}
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.accounts
+
+    def __getitem__(self, key: str) -> Snoo:
+        return self.accounts[key]
+
+    async def add_account(self, key: str, email: str, password: str) -> Snoo:
+        """Authorize a new account and schedule its token refreshes."""
+        if key in self.accounts:
+            raise SnooException(f"Account {key} is already in the pool.")
+        snoo = Snoo(email, password, self.session, auto_reauthorize=False)
+        async with self._limit():
+            await snoo.authorize()
+        self.accounts[key] = snoo
+        self._schedule(key)
+        return snoo
+
+    async def remove_account(self, key: str) -> None:
+        """Stop refreshing an account and disconnect all of its subscriptions."""
+        snoo = self.accounts.pop(key)
+        task = self._refresh_tasks.pop(key, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await snoo.disconnect()
+
+    async def close(self) -> None:
+        for key in list(self.accounts):
+            await self.remove_account(key)
+
+    def state(self) -> list[AccountState]:
+        now = asyncio.get_running_loop().time()
+        return [
+            AccountState(
+                key=key,
+                authorized=snoo.tokens is not None,
+                connected_devices=len(snoo._client_map),
+                subscribed_devices=len(snoo._mqtt_callbacks),
+                refresh_in=max(snoo.token_expires_at - self.refresh_margin - now, 0)
+                if snoo.token_expires_at is not None
+                else None,
+            )
+            for key, snoo in self.accounts.items()
+        ]
+
+    def _schedule(self, key: str, delay: float | None = None) -> None:
+        snoo = self.accounts[key]
+        if delay is None:
+            remaining = snoo.token_expires_at - asyncio.get_running_loop().time() - self.refresh_margin
+            delay = max(remaining - random.uniform(0, min(self.spread, max(remaining, 0))), 0)
+        self._refresh_tasks[key] = asyncio.create_task(self._refresh_later(key, delay))
+
+    async def _refresh_later(self, key: str, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            snoo = self.accounts[key]
+            async with self._limit():
+                try:
+                    await snoo.refresh_tokens()
+                    self.metrics.refreshes += 1
+                except (InvalidSnooAuth, SnooAuthException):
+                    self.metrics.refresh_failures += 1
+                    _LOGGER.warning(f"Token refresh failed for account {key}, re-authorizing.")
+                    await snoo.authorize()
+                    self.metrics.reauthorizations += 1
+                await snoo.restart_subscriptions()
+                # Hold the slot until the account is reconnected, so broker connects are limited too.
+                if not await snoo.wait_connected(self.connect_timeout):
+                    self.metrics.reconnect_timeouts += 1
+                    _LOGGER.warning(f"Account {key} did not fully reconnect within {self.connect_timeout} seconds.")
+                self.metrics.reconnects += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _LOGGER.exception(f"Could not refresh account {key}, retrying in {self.retry_delay} seconds.")
+            if key in self.accounts:
+                self._schedule(key, self.retry_delay)
+            return
+        if key in self.accounts:
+            self._schedule(key)
+
+    @asynccontextmanager
+    async def _limit(self) -> AsyncIterator[None]:
+        async with self._semaphore:
+            self.metrics.in_flight += 1
+            self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+            try:
+                yield
+            finally:
+                self.metrics.in_flight -= 1
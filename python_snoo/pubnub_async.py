@@ -15,6 +15,7 @@ from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub_asyncio import PubNubAsyncio
 
 from .containers import SnooData
+from .recording import RecordSource, TrafficRecorder
 
 _LOGGER = logging.getLogger(__name__)
 logging.basicConfig()
@@ -39,6 +40,7 @@ class SnooPubNub(SubscribeCallback):
         self._subscriptions: set[Callable[[SnooData], None]] = set()  # correct type hint
         self.connected = False
         self.task: asyncio.Task | None = None
+        self.recorder: TrafficRecorder | None = None
 
     def update_token(self, token: str):
         self.pubnub.config.auth_key = token
@@ -86,11 +88,17 @@ class SnooPubNub(SubscribeCallback):
             message.message,
         )
         if message.channel.split(".")[0] == "ActivityState":
-            if "system_state" in message.message:
-                for callback in self._subscriptions:
-                    data = SnooData.from_dict(message.message)
-                    _LOGGER.debug(data)
-                    callback(data)
+            if self.recorder is not None:
+                self.recorder.record(RecordSource.PUBNUB, self.device_id, message.message)
+            self.dispatch(message.message)
+
+    def dispatch(self, payload: dict) -> None:
+        """Decode an ActivityState payload and hand it to every subscriber."""
+        if "system_state" in payload:
+            for callback in self._subscriptions:
+                data = SnooData.from_dict(payload)
+                _LOGGER.debug(data)
+                callback(data)
 
     def subscribe(self, update_callback: Callable[[SnooData], None]) -> Callable[[], None]:
         """Add an callback subscriber.
@@ -0,0 +1,176 @@
+"""Record raw device traffic and replay it through the normal decode pipeline."""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .snoo import Snoo
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RecordSource(StrEnum):
+    MQTT = "mqtt"
+    PUBNUB = "pubnub"
+
+
+class TrafficRecorder:
+    """Append raw payloads with their arrival time to a log file.
+
+    Each line is a compact JSON array of ``[timestamp, source, device_id, payload]``.
+    Files ending in ``.gz`` are gzip compressed; appending to an existing gzip log
+    adds a new member, which readers handle transparently.
+
+    ``record`` only serializes the line and queues it, so it is safe to call from the
+    event loop; a background thread does the (possibly compressed) file writes. ``close``
+    waits for that thread to drain the queue, and is also run at interpreter exit so the
+    gzip trailer gets written. If a previous process died without closing a gzip log, the
+    readable part is salvaged before appending so new records stay reachable.
+    """
+
+    def __init__(self, path: str, compress: bool | None = None, flush_every: int = 100) -> None:
+        self.path = path
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.flush_every = flush_every
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def open(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._write_loop, name="snoo-traffic-recorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _repair_truncated_gzip(self) -> None:
+        """Rewrite a gzip log that ends mid-member, keeping every complete line."""
+        lines = []
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    lines.append(line)
+            return
+        except FileNotFoundError:
+            return
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            pass
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+        _LOGGER.warning(f"Recovered {len(lines)} records from truncated traffic log {self.path}")
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+    def _write_loop(self) -> None:
+        opener = gzip.open if self.compress else open
+        if self.compress:
+            self._repair_truncated_gzip()
+        with opener(self.path, "at", encoding="utf-8") as f:
+            pending = 0
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    break
+                f.write(line)
+                pending += 1
+                # Flush in batches, and whenever we have caught up with the producer.
+                if pending >= self.flush_every or self._queue.empty():
+                    f.flush()
+                    pending = 0
+
+    def record(self, source: RecordSource, device_id: str, payload: str | dict) -> None:
+        if self._thread is None:
+            self.open()
+        self._queue.put(json.dumps([time.time(), source.value, device_id, payload], separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> TrafficRecorder:
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TrafficReplayer:
+    """Feed a recorded log back through a Snoo's decode and dispatch path."""
+
+    def __init__(self, path: str, compress: bool | None = None) -> None:
+        self.path = path
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.failures = 0
+
+    def entries(self) -> Iterator[tuple[float, RecordSource, str, str | dict]]:
+        opener = gzip.open if self.compress else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        ts, source, device_id, payload = json.loads(line)
+                    except ValueError:
+                        # Most likely the last line of a log whose writer was killed mid-write.
+                        _LOGGER.warning(f"Skipping unreadable line in traffic log {self.path}")
+                        continue
+                    yield ts, RecordSource(source), device_id, payload
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                _LOGGER.warning(f"Traffic log {self.path} is truncated; replaying the records before the cut")
+
+    async def replay(self, snoo: Snoo, speed: float | None = 1.0) -> int:
+        """Replay the log into the subscriptions registered on ``snoo``.
+
+        ``speed`` scales the original inter-arrival delays; ``None`` replays as fast as possible.
+        Returns the number of messages dispatched. Messages that fail to decode are logged
+        and counted in ``failures`` rather than stopping the replay, as on the live path.
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive, or None to replay as fast as possible")
+        dispatched = 0
+        self.failures = 0
+        previous_ts: float | None = None
+        for ts, source, device_id, payload in self.entries():
+            if speed is not None and previous_ts is not None and ts > previous_ts:
+                await asyncio.sleep((ts - previous_ts) / speed)
+            previous_ts = ts
+
+            try:
+                if source == RecordSource.MQTT:
+                    if device_id not in snoo._mqtt_callbacks:
+                        _LOGGER.debug(f"No MQTT subscription for {device_id}, skipping recorded message")
+                        continue
+                    _, function = snoo._mqtt_callbacks[device_id]
+                    snoo.handle_mqtt_payload(payload, function)
+                else:
+                    pubnub_instance = snoo.pubnub_instances.get(device_id)
+                    if pubnub_instance is None:
+                        _LOGGER.debug(f"No PubNub subscription for {device_id}, skipping recorded message")
+                        continue
+                    pubnub_instance.dispatch(payload)
+            except Exception as e:
+                self.failures += 1
+                _LOGGER.error(f"Failed to replay {source} message for {device_id}: {e}")
+                continue
+            dispatched += 1
+        return dispatched
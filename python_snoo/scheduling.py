@@ -0,0 +1,120 @@
+"""Order outgoing commands by priority and rate-limit each priority class."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import heapq
+import itertools
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from .commands import CommandPriority
+
+
+@dataclasses.dataclass
+class RateLimit:
+    """Allow ``rate`` commands per second on average, with bursts of up to ``burst``."""
+
+    rate: float
+    burst: int = 1
+
+
+@dataclasses.dataclass
+class QueueWaitStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, wait: float) -> None:
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+
+DEFAULT_RATE_LIMITS: dict[CommandPriority, RateLimit] = {
+    CommandPriority.ROUTINE: RateLimit(rate=1.0, burst=5),
+}
+
+
+class _TokenBucket:
+    def __init__(self, limit: RateLimit) -> None:
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated: float | None = None
+
+    async def take(self) -> None:
+        now = asyncio.get_running_loop().time()
+        if self.updated is not None:
+            self.tokens = min(self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate)
+        self.updated = now
+        # Reserve a token now, so concurrent callers queue up behind each other.
+        self.tokens -= 1
+        if self.tokens < 0:
+            try:
+                await asyncio.sleep(-self.tokens / self.limit.rate)
+            except asyncio.CancelledError:
+                # Give the reservation back so cancelled callers don't keep the class throttled.
+                self.tokens += 1
+                raise
+
+
+class CommandScheduler:
+    """Grant the outgoing command path to one caller at a time, highest priority first.
+
+    Each priority class is rate-limited separately before it queues, so a burst of
+    routine polls waits on its own limit and never holds up an urgent command. Time
+    spent rate-limited and queued is recorded per class in ``wait_stats``.
+    """
+
+    def __init__(self, rate_limits: dict[CommandPriority, RateLimit] | None = None) -> None:
+        if rate_limits is None:
+            rate_limits = DEFAULT_RATE_LIMITS
+        self._buckets = {priority: _TokenBucket(limit) for priority, limit in rate_limits.items()}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._busy = False
+        self.wait_stats: dict[CommandPriority, QueueWaitStats] = {p: QueueWaitStats() for p in CommandPriority}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    @asynccontextmanager
+    async def slot(self, priority: CommandPriority) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if priority in self._buckets:
+            await self._buckets[priority].take()
+        await self._acquire(priority)
+        self.wait_stats[priority].add(loop.time() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: CommandPriority) -> None:
+        if not self._busy:
+            self._busy = True
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were handed the slot just as we were cancelled; pass it on.
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._busy = False
@@ -0,0 +1,211 @@
+"""Incrementally build sleep sessions and rolling aggregates from the SnooData stream."""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+
+from .containers import SnooData, SnooEvents, SnooLevels
+from .history import SnooDataHistory
+
+LEVEL_RANK: dict[SnooLevels, int] = {
+    SnooLevels.baseline: 0,
+    SnooLevels.weaning_baseline: 0,
+    SnooLevels.level1: 1,
+    SnooLevels.level2: 2,
+    SnooLevels.level3: 3,
+    SnooLevels.level4: 4,
+}
+
+
+@dataclasses.dataclass
+class SessionStats:
+    """Totals over a group of sessions, such as a day or a week."""
+
+    sessions: int = 0
+    duration_ms: int = 0
+    level_ms: dict[SnooLevels, int] = dataclasses.field(default_factory=dict)
+    cry_events: int = 0
+    escalations: int = 0
+
+    def add(self, duration_ms: int, level: SnooLevels | None, cry_events: int, escalations: int) -> None:
+        self.duration_ms += duration_ms
+        if level is not None and duration_ms:
+            self.level_ms[level] = self.level_ms.get(level, 0) + duration_ms
+        self.cry_events += cry_events
+        self.escalations += escalations
+
+
+@dataclasses.dataclass
+class SleepSession:
+    """A single sleep session, identified by the state machine's session_id."""
+
+    session_id: str
+    start_ms: int
+    stats: SessionStats = dataclasses.field(default_factory=lambda: SessionStats(sessions=1))
+    active: bool = True
+    last_offset_ms: int = 0
+    last_level: SnooLevels | None = None
+    last_update_ms: int = 0
+
+    @property
+    def start(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.start_ms / 1000, datetime.timezone.utc)
+
+
+class SleepSessionEngine:
+    """Track sleep sessions as updates arrive instead of replaying the full history.
+
+    Pass ``update`` as a subscription callback. Each update attributes the time elapsed
+    since the previous update of the same session to the level that was active, and the
+    same delta is applied to the session's daily and ISO-weekly aggregates, so every
+    update is O(1) regardless of how much history has been seen. Aggregates are bucketed
+    by session start in ``tz`` and only the last ``retention_days`` days are kept.
+
+    A session ends when an update reports it inactive, or once no update has arrived
+    for ``idle_timeout`` of event time, in case the final update was missed. Only ended
+    sessions are evicted to keep ``sessions`` within ``max_sessions``.
+    """
+
+    def __init__(
+        self,
+        tz: datetime.tzinfo = datetime.timezone.utc,
+        retention_days: int | None = 90,
+        max_sessions: int | None = None,
+        idle_timeout: datetime.timedelta | None = datetime.timedelta(hours=12),
+    ) -> None:
+        self.tz = tz
+        self.idle_timeout_ms = idle_timeout // datetime.timedelta(milliseconds=1) if idle_timeout else None
+        self._latest_ms = 0
+        self.retention_days = retention_days
+        self.max_sessions = max_sessions
+        self.sessions: dict[str, SleepSession] = {}
+        self.daily: dict[datetime.date, SessionStats] = {}
+        self.weekly: dict[tuple[int, int], SessionStats] = {}
+
+    def update(self, data: SnooData) -> SleepSession | None:
+        sm = data.state_machine
+        return self._ingest(
+            sm.session_id,
+            data.event_time_ms,
+            sm.since_session_start_ms,
+            sm.level,
+            data.event == SnooEvents.CRY,
+            sm.is_active_session,
+        )
+
+    def ingest_history(self, history: SnooDataHistory) -> None:
+        """Batch-ingest a recorded history straight from its columns.
+
+        Enum lookups are resolved once per interned string rather than once per record,
+        and no SnooData objects are materialized.
+        """
+        strings = history.strings.values
+        level_values = {level.value for level in SnooLevels}
+        levels = [SnooLevels(value) if value in level_values else None for value in strings]
+        is_cry = [value == SnooEvents.CRY.value for value in strings]
+        for session_code, event_time_ms, since_ms, level_code, event_code, active in zip(
+            history.codes("session_id"),
+            history.event_time_ms,
+            history.since_session_start_ms,
+            history.codes("level"),
+            history.codes("event"),
+            history.is_active_session,
+        ):
+            self._ingest(
+                strings[session_code], event_time_ms, since_ms, levels[level_code], is_cry[event_code], bool(active)
+            )
+
+    def _ingest(
+        self,
+        session_id: str,
+        event_time_ms: int,
+        since_ms: int,
+        level: SnooLevels | None,
+        cry: bool,
+        active: bool,
+    ) -> SleepSession | None:
+        self._latest_ms = max(self._latest_ms, event_time_ms)
+        session = self.sessions.get(session_id)
+        if session is not None and session.active and self._idle(session, event_time_ms):
+            # Treat a session that went quiet as ended, just as if its last update said so.
+            session.active = False
+        if session is None:
+            if not active:
+                return None
+            session = SleepSession(session_id=session_id, start_ms=event_time_ms - since_ms, last_offset_ms=since_ms)
+            self.sessions[session_id] = session
+            for stats in self._buckets(session):
+                stats.sessions += 1
+            # Time before the first update we saw can't be attributed to a level.
+            elapsed, elapsed_level = since_ms, None
+            escalations = 0
+        elif not session.active:
+            # The session already ended and its closing interval was counted.
+            return session
+        else:
+            # Keep sessions ordered by last update, for eviction.
+            self.sessions[session_id] = self.sessions.pop(session_id)
+            elapsed = max(since_ms - session.last_offset_ms, 0)
+            elapsed_level = session.last_level
+            session.last_offset_ms = max(since_ms, session.last_offset_ms)
+            escalations = int(
+                level in LEVEL_RANK
+                and session.last_level in LEVEL_RANK
+                and LEVEL_RANK[level] > LEVEL_RANK[session.last_level]
+            )
+
+        session.last_level = level
+        session.active = active
+        session.last_update_ms = max(event_time_ms, session.last_update_ms)
+        cry_events = int(cry)
+        session.stats.add(elapsed, elapsed_level, cry_events, escalations)
+        for stats in self._buckets(session):
+            stats.add(elapsed, elapsed_level, cry_events, escalations)
+        self._evict()
+        return session
+
+    def _evict(self) -> None:
+        """Drop the least recently updated ended sessions beyond ``max_sessions``.
+
+        Sessions still receiving updates are never evicted, so an update can't recreate
+        and double-count one.
+        """
+        if self.max_sessions is None or len(self.sessions) <= self.max_sessions:
+            return
+        excess = len(self.sessions) - self.max_sessions
+        ended = [
+            sid for sid, session in self.sessions.items() if not session.active or self._idle(session, self._latest_ms)
+        ]
+        for session_id in ended[:excess]:
+            self.sessions[session_id].active = False
+            del self.sessions[session_id]
+
+    def _idle(self, session: SleepSession, now_ms: int) -> bool:
+        return self.idle_timeout_ms is not None and now_ms - session.last_update_ms > self.idle_timeout_ms
+
+    def _buckets(self, session: SleepSession) -> tuple[SessionStats, SessionStats]:
+        day = session.start.astimezone(self.tz).date()
+        week = day.isocalendar()[:2]
+        if day not in self.daily:
+            self.daily[day] = SessionStats()
+            self._prune(day)
+        if week not in self.weekly:
+            self.weekly[week] = SessionStats()
+        return self.daily[day], self.weekly[week]
+
+    def _prune(self, newest: datetime.date) -> None:
+        if self.retention_days is None:
+            return
+        cutoff = newest - datetime.timedelta(days=self.retention_days)
+        for day in [day for day in self.daily if day < cutoff]:
+            del self.daily[day]
+        cutoff_week = cutoff.isocalendar()[:2]
+        for week in [week for week in self.weekly if week < cutoff_week]:
+            del self.weekly[week]
+
+    def day(self, date: datetime.date) -> SessionStats:
+        return self.daily.get(date, SessionStats())
+
+    def week(self, date: datetime.date) -> SessionStats:
+        return self.weekly.get(date.isocalendar()[:2], SessionStats())
@@ -0,0 +1,414 @@
+"""Spread MQTT connections and payload decoding across worker processes."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import logging
+import multiprocessing
+import zlib
+from collections.abc import Callable
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+
+import aiohttp
+
+from .commands import CommandPriority, command_priority
+from .containers import AuthorizationInfo, SnooData, SnooDevice, SnooEvents, SnooLevels, SnooStateMachine, SnooStates
+from .exceptions import SnooCommandException, SnooException
+from .scheduling import RateLimit
+from .snoo import Snoo
+
+_LOGGER = logging.getLogger(__name__)
+
+# Messages sent from the parent to a shard.
+_SUBSCRIBE = "subscribe"
+_UNSUBSCRIBE = "unsubscribe"
+_COMMAND = "command"
+_TOKENS = "tokens"
+_STOP = "stop"
+# Messages sent from a shard to the parent.
+_DATA = "data"
+_DELTA = "delta"
+_RESULT = "result"
+
+# SnooData crosses the pipe as a flat tuple of primitives in this field order, and after
+# the first update of a device only as the (index, value) pairs that changed.
+_DATA_FIELDS = (
+    "left_safety_clip",
+    "rx_signal",
+    "right_safety_clip",
+    "sw_version",
+    "event_time_ms",
+    "system_state",
+    "event",
+)
+_STATE_MACHINE_FIELDS = (
+    "up_transition",
+    "since_session_start_ms",
+    "sticky_white_noise",
+    "weaning",
+    "time_left",
+    "session_id",
+    "state",
+    "is_active_session",
+    "down_transition",
+    "hold",
+    "audio",
+    "time_left_timestamp",
+    "level",
+)
+_SPLIT = len(_DATA_FIELDS)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_EVENTS = {event.value: event for event in SnooEvents}
+_STATES = {state.value: state for state in SnooStates}
+_LEVELS = {level.value: level for level in SnooLevels}
+
+
+def _encode(data: SnooData) -> tuple:
+    sm = data.state_machine
+    return (
+        data.left_safety_clip,
+        data.rx_signal,
+        data.right_safety_clip,
+        data.sw_version,
+        data.event_time_ms,
+        data.system_state,
+        data.event.value,
+        sm.up_transition,
+        sm.since_session_start_ms,
+        sm.sticky_white_noise,
+        sm.weaning,
+        sm.time_left,
+        sm.session_id,
+        sm.state.value,
+        sm.is_active_session,
+        sm.down_transition,
+        sm.hold,
+        sm.audio,
+        (sm.time_left_timestamp - _EPOCH) // _MICROSECOND if sm.time_left_timestamp is not None else None,
+        sm.level.value if sm.level is not None else None,
+    )
+
+
+def _delta(previous: tuple, row: tuple) -> tuple:
+    return tuple((index, value) for index, (old, value) in enumerate(zip(previous, row)) if old != value)
+
+
+def _apply(previous: tuple, delta: tuple) -> tuple:
+    row = list(previous)
+    for index, value in delta:
+        row[index] = value
+    return tuple(row)
+
+
+def _decode(row: tuple) -> SnooData:
+    """Rebuild SnooData from a wire row.
+
+    The dataclasses are filled in directly: the row already holds the timestamp and level
+    the shard computed, which ``__post_init__`` would otherwise recompute from the clock.
+    """
+    data = dict(zip(_DATA_FIELDS, row[:_SPLIT]))
+    data["rx_signal"] = dict(data["rx_signal"])
+    data["event"] = _EVENTS[data["event"]]
+    state = dict(zip(_STATE_MACHINE_FIELDS, row[_SPLIT:]))
+    state["state"] = _STATES[state["state"]]
+    if state["time_left_timestamp"] is not None:
+        state["time_left_timestamp"] = _EPOCH + state["time_left_timestamp"] * _MICROSECOND
+    if state["level"] is not None:
+        state["level"] = _LEVELS[state["level"]]
+    state_machine = object.__new__(SnooStateMachine)
+    state_machine.__dict__.update(state)
+    data["state_machine"] = state_machine
+    snoo_data = object.__new__(SnooData)
+    snoo_data.__dict__.update(data)
+    return snoo_data
+
+
+class _ShardWorker:
+    """Runs inside a worker process and owns the connections for a subset of devices."""
+
+    def __init__(self, conn: Connection, tokens: AuthorizationInfo) -> None:
+        self.conn = conn
+        # Only MQTT is used in the worker, which needs the tokens but no HTTP session.
+        # Commands are rate-limited in the parent, across all shards, so none are applied here.
+        self.snoo = Snoo("", "", None, auto_reauthorize=False, rate_limits={})
+        self.snoo.tokens = tokens
+        self.stopped: asyncio.Event | None = None
+        # The last row sent for each device, which its next update is diffed against.
+        self.rows: dict[str, tuple] = {}
+
+    async def run(self) -> None:
+        self.stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.conn.fileno(), self._read)
+        try:
+            await self.stopped.wait()
+        finally:
+            loop.remove_reader(self.conn.fileno())
+            await self.snoo.disconnect()
+
+    def _read(self) -> None:
+        try:
+            while self.conn.poll():
+                self._handle(self.conn.recv())
+        except EOFError:
+            # The parent went away.
+            self.stopped.set()
+
+    def _handle(self, message: tuple) -> None:
+        kind = message[0]
+        if kind == _SUBSCRIBE:
+            device: SnooDevice = message[1]
+            self.snoo.start_subscribe(device, self._forwarder(device.serialNumber))
+        elif kind == _UNSUBSCRIBE:
+            serial = message[1]
+            self.rows.pop(serial, None)
+            self.snoo._mqtt_callbacks.pop(serial, None)
+            task = self.snoo._mqtt_tasks.pop(serial, None)
+            if task:
+                task.cancel()
+        elif kind == _COMMAND:
+            _, request_id, device, command, priority, kwargs = message
+            asyncio.create_task(self._command(request_id, device, command, priority, kwargs))
+        elif kind == _TOKENS:
+            self.snoo.tokens = message[1]
+            asyncio.create_task(self.snoo.restart_subscriptions())
+        elif kind == _STOP:
+            self.stopped.set()
+
+    def _forwarder(self, serial: str) -> Callable[[SnooData], None]:
+        def forward(data: SnooData) -> None:
+            row = _encode(data)
+            previous = self.rows.get(serial)
+            self.rows[serial] = row
+            if previous is None:
+                self.conn.send((_DATA, serial, row))
+            else:
+                self.conn.send((_DELTA, serial, _delta(previous, row)))
+
+        return forward
+
+    async def _command(
+        self, request_id: int, device: SnooDevice, command: str, priority: CommandPriority | None, kwargs: dict
+    ) -> None:
+        error = None
+        try:
+            await self.snoo.send_command(command, device, priority=priority, **kwargs)
+        except Exception as ex:
+            error = repr(ex.__cause__ or ex)
+        self.conn.send((_RESULT, request_id, error))
+
+
+def _shard_main(conn: Connection, tokens: AuthorizationInfo) -> None:
+    asyncio.run(_ShardWorker(conn, tokens).run())
+
+
+class _Shard:
+    def __init__(self, index: int, process: BaseProcess, conn: Connection) -> None:
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.fileno = conn.fileno()
+        self.alive = True
+        self.devices: set[str] = set()
+        self.pending: set[int] = set()
+
+
+class ShardedSnoo(Snoo):
+    """A Snoo whose device subscriptions run in ``shards`` worker processes.
+
+    Authorization, token refresh and the REST calls stay in the parent. Each device is
+    assigned to a shard by a stable hash of its serial number. That shard's process holds
+    the MQTT connection and decodes every payload. Only the fields that changed since the
+    device's previous update are sent back over a pipe, as primitives, and the parent
+    rebuilds SnooData from them for the callback given to ``start_subscribe``. Commands are routed to
+    the owning shard, so ``send_command`` and the helpers built on it behave as on ``Snoo``.
+    ``rate_limits`` apply to all shards together: commands wait for their limit and queue
+    by priority in the parent, which records ``command_scheduler.wait_stats``, before they
+    are handed to a shard.
+    If a worker dies, its pending commands fail with SnooCommandException and it is
+    respawned with the same devices.
+    Requires an event loop that supports ``add_reader`` (any POSIX selector loop).
+    """
+
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        clientsession: aiohttp.ClientSession,
+        shards: int | None = None,
+        auto_reauthorize: bool = True,
+        rate_limits: dict[CommandPriority, RateLimit] | None = None,
+    ):
+        super().__init__(email, password, clientsession, auto_reauthorize=auto_reauthorize, rate_limits=rate_limits)
+        self.shard_count = shards or multiprocessing.cpu_count()
+        self._shards: list[_Shard] = []
+        self._pending: dict[int, asyncio.Future] = {}
+        # The last row received for each device, which deltas from its shard apply to.
+        self._rows: dict[str, tuple] = {}
+        self._request_ids = itertools.count()
+        self._closing = False
+
+    def _start_shards(self) -> None:
+        if self._shards:
+            return
+        if self.tokens is None:
+            raise SnooException("You need to authenticate before you subscribe")
+        self._closing = False
+        self._shards = [self._spawn(index) for index in range(self.shard_count)]
+
+    def _spawn(self, index: int) -> _Shard:
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=_shard_main, args=(child_conn, self.tokens), name=f"snoo-shard-{index}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        shard = _Shard(index, process, parent_conn)
+        asyncio.get_running_loop().add_reader(shard.fileno, self._read, shard)
+        return shard
+
+    def _shard_for(self, serial: str) -> _Shard:
+        return self._shards[zlib.crc32(serial.encode()) % len(self._shards)]
+
+    def _send(self, shard: _Shard, message: tuple) -> None:
+        if not shard.alive:
+            raise SnooCommandException(f"Shard {shard.index} is not running.")
+        try:
+            shard.conn.send(message)
+        except (OSError, EOFError, ValueError) as ex:
+            self._shard_died(shard)
+            raise SnooCommandException(f"Shard {shard.index} exited.") from ex
+
+    def _shard_died(self, shard: _Shard) -> None:
+        if not shard.alive:
+            return
+        shard.alive = False
+        asyncio.get_running_loop().remove_reader(shard.fileno)
+        shard.conn.close()
+        for request_id in shard.pending:
+            future = self._pending.pop(request_id, None)
+            if future and not future.done():
+                future.set_result(f"Shard {shard.index} exited before answering.")
+        shard.pending.clear()
+        if self._closing:
+            return
+
+        _LOGGER.error(f"Shard {shard.index} exited; respawning it for its {len(shard.devices)} devices.")
+        try:
+            new_shard = self._spawn(shard.index)
+        except Exception:
+            _LOGGER.exception(f"Could not respawn shard {shard.index}; its devices stay disconnected.")
+            return
+        self._shards[shard.index] = new_shard
+        for serial in shard.devices:
+            if serial in self._mqtt_callbacks:
+                new_shard.devices.add(serial)
+                self._send(new_shard, (_SUBSCRIBE, self._mqtt_callbacks[serial][0]))
+
+    def _read(self, shard: _Shard) -> None:
+        try:
+            while shard.conn.poll():
+                message = shard.conn.recv()
+                if message[0] == _DATA or message[0] == _DELTA:
+                    kind, serial, payload = message
+                    if serial not in self._mqtt_callbacks:
+                        continue
+                    if kind == _DATA:
+                        row = payload
+                    elif serial in self._rows:
+                        row = _apply(self._rows[serial], payload)
+                    else:
+                        _LOGGER.warning(f"Dropping an update for {serial} received before its first full update.")
+                        continue
+                    self._rows[serial] = row
+                    self._mqtt_callbacks[serial][1](_decode(row))
+                elif message[0] == _RESULT:
+                    _, request_id, error = message
+                    shard.pending.discard(request_id)
+                    future = self._pending.pop(request_id, None)
+                    if future and not future.done():
+                        future.set_result(error)
+        except (EOFError, OSError):
+            self._shard_died(shard)
+
+    def start_subscribe(self, device: SnooDevice, function: Callable):
+        """Subscribe ``device`` on its shard.
+
+        Raises SnooCommandException if the shard has exited; the device stays registered
+        and is subscribed again when the shard is respawned.
+        """
+        self._start_shards()
+        shard = self._shard_for(device.serialNumber)
+        self._mqtt_callbacks[device.serialNumber] = (device, function)
+        shard.devices.add(device.serialNumber)
+        self._send(shard, (_SUBSCRIBE, device))
+
+    async def unsubscribe(self, device: SnooDevice):
+        self._mqtt_callbacks.pop(device.serialNumber, None)
+        self._rows.pop(device.serialNumber, None)
+        if self._shards:
+            shard = self._shard_for(device.serialNumber)
+            shard.devices.discard(device.serialNumber)
+            self._send(shard, (_UNSUBSCRIBE, device.serialNumber))
+
+    async def send_command(self, command: str, device: SnooDevice, priority: CommandPriority | None = None, **kwargs):
+        if not self._shards:
+            raise SnooCommandException(f"Client for device {device.serialNumber} is not connected.")
+        if priority is None:
+            priority = command_priority(command, **kwargs)
+        device = self._mqtt_callbacks.get(device.serialNumber, (device,))[0]
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        shard = None
+        try:
+            # The slot is only held until the command is handed over, so a shard still
+            # waiting for its client to connect doesn't hold up the others.
+            async with self.command_scheduler.slot(priority):
+                if not self._shards:
+                    raise SnooCommandException(f"Client for device {device.serialNumber} disconnected.")
+                shard = self._shard_for(device.serialNumber)
+                shard.pending.add(request_id)
+                self._send(shard, (_COMMAND, request_id, device, command, priority, kwargs))
+            # The shard waits up to 30 seconds for its client to connect; allow a little more.
+            error = await asyncio.wait_for(future, timeout=35.0)
+        except asyncio.TimeoutError:
+            raise SnooCommandException(f"Shard did not answer command for {device.serialNumber}.") from None
+        finally:
+            self._pending.pop(request_id, None)
+            if shard is not None:
+                shard.pending.discard(request_id)
+        if error is not None:
+            raise SnooCommandException(error)
+
+    async def restart_subscriptions(self):
+        for shard in self._shards:
+            try:
+                self._send(shard, (_TOKENS, self.tokens))
+            except SnooCommandException:
+                # A respawned shard already started with the current tokens.
+                pass
+
+    async def disconnect(self):
+        self._closing = True
+        for shard in self._shards:
+            if shard.alive:
+                try:
+                    shard.conn.send((_STOP,))
+                except (OSError, ValueError):
+                    pass
+        for shard in self._shards:
+            await asyncio.to_thread(shard.process.join, 10)
+            if shard.process.is_alive():
+                shard.process.terminate()
+            self._shard_died(shard)
+        self._shards = []
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        await super().disconnect()
@@ -13,20 +13,31 @@ from pubnub.enums import PNReconnectionPolicy
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub_asyncio import PubNubAsyncio
 
+from .commands import CommandPriority, command_priority
 from .containers import (
     AuthorizationInfo,
     SnooData,
     SnooDevice,
     SnooStates,
 )
+from .device_cache import DeviceCache, DeviceChanges, devices_version, diff_devices
 from .exceptions import InvalidSnooAuth, SnooAuthException, SnooCommandException, SnooDeviceError
 from .pubnub_async import SnooPubNub
+from .recording import RecordSource, TrafficRecorder
+from .scheduling import CommandScheduler, RateLimit
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class Snoo:
-    def __init__(self, email: str, password: str, clientsession: aiohttp.ClientSession):
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        clientsession: aiohttp.ClientSession,
+        auto_reauthorize: bool = True,
+        rate_limits: dict[CommandPriority, RateLimit] | None = None,
+    ):
         self.email = email
         self.password = password
         self.session = clientsession
@@ -90,10 +101,29 @@ class Snoo:
         self.data_map = {}
         self.pubnub_instances: dict[str, SnooPubNub] = {}
         self.reauth_task: asyncio.Task | None = None
+        # When False, the owner (e.g. a SnooPool) is responsible for refreshing tokens before they expire.
+        self.auto_reauthorize = auto_reauthorize
+        self.token_expires_at: float | None = None
         self._client_map: dict[str, aiomqtt.Client] = {}
         self._mqtt_tasks: dict[str, asyncio.Task] = {}
         self._mqtt_callbacks: dict[str, tuple[SnooDevice, Callable]] = {}
         self._client_cond = asyncio.Condition()
+        self.command_scheduler = CommandScheduler(rate_limits)
+        self.device_refresh_task: asyncio.Task | None = None
+        # The latest device list seen by subscribe_cached_devices or refresh_devices.
+        self.devices: list[SnooDevice] = []
+        self._recorder: TrafficRecorder | None = None
+
+    @property
+    def recorder(self) -> TrafficRecorder | None:
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder: TrafficRecorder | None):
+        # PubNub instances record on their own, so keep every existing one in sync.
+        self._recorder = recorder
+        for pubnub_instance in self.pubnub_instances.values():
+            pubnub_instance.recorder = recorder
 
     async def refresh_tokens(self) -> int:
         """Refreshes AWS Cognito tokens and returns the new expiration time in seconds."""
@@ -127,7 +157,9 @@ class Snoo:
             aws_refresh=result.get("RefreshToken", self.tokens.aws_refresh),
         )
         _LOGGER.info("✅ Successfully refreshed AWS Cognito tokens.")
-        return result.get("ExpiresIn", 3600)
+        expires_in = result.get("ExpiresIn", 3600)
+        self.token_expires_at = asyncio.get_running_loop().time() + expires_in
+        return expires_in
 
     def check_tokens(self):
         if self.tokens is None:
@@ -168,6 +200,7 @@ class Snoo:
         if device_id not in self.pubnub_instances:
             self.pubnub_instances[device_id] = SnooPubNub(self.pubnub, device_id)
         pubnub_instance = self.pubnub_instances[device_id]
+        pubnub_instance.recorder = self._recorder
         unsub = pubnub_instance.subscribe(function)
         asyncio.create_task(pubnub_instance.run())
         return unsub
@@ -192,12 +225,23 @@ class Snoo:
             self.reauth_task.cancel()
             self.reauth_task = None
 
+        if self.device_refresh_task:
+            self.device_refresh_task.cancel()
+            self.device_refresh_task = None
+
+        if self._recorder is not None:
+            # Closing drains the queue and finishes the log file; recording reopens it if used again.
+            await asyncio.to_thread(self._recorder.close)
+
     def publish_callback(self, result, status):
         if status.is_error():
             _LOGGER.warning(f"Message failed with {status.status_code}, {status.error_data.__dict__}")
 
-    async def send_command(self, command: str, device: SnooDevice, **kwargs):
-        ts = int(dt.now().timestamp() * 10_000_000)
+    async def send_command(self, command: str, device: SnooDevice, priority: CommandPriority | None = None, **kwargs):
+        if priority is None:
+            priority = command_priority(command, **kwargs)
+        # Use the latest known device, as a device refresh may have moved it to a new thing name.
+        device = self._mqtt_callbacks.get(device.serialNumber, (device,))[0]
         try:
             # Acquire the condition lock
             async with self._client_cond:
@@ -210,8 +254,13 @@ class Snoo:
                     _LOGGER.error(f"Timed out waiting for client for device {device.serialNumber} to connect.")
                     raise SnooCommandException(f"Client for device {device.serialNumber} is not connected.") from None
 
-                # Once wait_for returns, we know the client exists and we hold the lock.
-                await self._client_map[device.serialNumber].publish(
+            # Queued commands are sent in priority order, so a stop never waits behind status polls.
+            async with self.command_scheduler.slot(priority):
+                client = self._client_map.get(device.serialNumber)
+                if client is None:
+                    raise SnooCommandException(f"Client for device {device.serialNumber} disconnected.")
+                ts = int(dt.now().timestamp() * 10_000_000)
+                await client.publish(
                     topic=f"{device.awsIoT.thingName}/state_machine/control",
                     payload=json.dumps({"ts": ts, "command": command, **kwargs}),
                 )
@@ -267,9 +316,13 @@ class Snoo:
             snoo_token = snoo_token_data["snoo"]["token"]
 
             self.tokens = AuthorizationInfo(snoo=snoo_token, aws_access=access, aws_id=_id, aws_refresh=ref)
+            self.token_expires_at = asyncio.get_running_loop().time() + expires_in
 
             if self.reauth_task:
                 self.reauth_task.cancel()
+                self.reauth_task = None
+            if not self.auto_reauthorize:
+                return self.tokens
 
             # Schedule reauthorization with a 5-minute buffer before expiry
             reauth_delay = max(expires_in - 300, 0)
@@ -288,23 +341,7 @@ class Snoo:
             _LOGGER.info("Executing scheduled token refresh...")
 
             new_expires_in = await self.refresh_tokens()
-
-            _LOGGER.info("Restarting MQTT subscriptions with new token...")
-            # Cancel all existing MQTT tasks
-            for task in self._mqtt_tasks.values():
-                task.cancel()
-            await asyncio.gather(*self._mqtt_tasks.values(), return_exceptions=True)
-            self._mqtt_tasks.clear()
-
-            # The `finally` block in `subscribe_mqtt` should clear the `_client_map`
-            # as connections close.
-
-            # Re-subscribe for all previously active subscriptions
-            for device_sn, (device, function) in self._mqtt_callbacks.items():
-                _LOGGER.info(f"Re-establishing MQTT subscription for device {device_sn}")
-                self.start_subscribe(device, function)
-
-            _LOGGER.info("✅ MQTT subscriptions restarted successfully.")
+            await self.restart_subscriptions()
 
             # Schedule the *next* reauthorization
             reauth_delay = max(new_expires_in - 300, 0)
@@ -316,6 +353,37 @@ class Snoo:
         except Exception:
             _LOGGER.exception("An unexpected error occurred during reauthorization.")
 
+    async def restart_subscriptions(self):
+        """Reconnect every MQTT subscription, picking up the current token."""
+        _LOGGER.info("Restarting MQTT subscriptions with new token...")
+        # Cancel all existing MQTT tasks
+        for task in self._mqtt_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._mqtt_tasks.values(), return_exceptions=True)
+        self._mqtt_tasks.clear()
+
+        # The `finally` block in `subscribe_mqtt` should clear the `_client_map`
+        # as connections close.
+
+        # Re-subscribe for all previously active subscriptions
+        for device_sn, (device, function) in self._mqtt_callbacks.items():
+            _LOGGER.info(f"Re-establishing MQTT subscription for device {device_sn}")
+            self.start_subscribe(device, function)
+
+        _LOGGER.info("✅ MQTT subscriptions restarted successfully.")
+
+    async def wait_connected(self, timeout: float) -> bool:
+        """Wait until every subscribed device has a connected MQTT client; False on timeout."""
+        async with self._client_cond:
+            try:
+                await asyncio.wait_for(
+                    self._client_cond.wait_for(lambda: all(sn in self._client_map for sn in self._mqtt_callbacks)),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                return False
+        return True
+
     async def get_devices(self) -> list[SnooDevice]:
         hdrs = self.generate_snoo_auth_headers(self.tokens.aws_id)
         try:
@@ -326,6 +394,85 @@ class Snoo:
         devs = [SnooDevice.from_dict(dev) for dev in resp["snoo"]]
         return devs
 
+    async def subscribe_cached_devices(
+        self,
+        cache: DeviceCache,
+        function: Callable,
+        on_change: Callable[[DeviceChanges, list[SnooDevice]], None] | None = None,
+    ) -> list[SnooDevice]:
+        """Subscribe to every device, using the cached device list when there is one.
+
+        With a cache, subscriptions start immediately from the cached endpoints and
+        `refresh_devices` runs in the background to reconcile any changes. The returned
+        list may then go stale; `self.devices` always holds the latest one, and
+        `on_change` is called with the changes and the new list whenever it differs.
+        Without a cache, this waits for `get_devices` and fills the cache.
+        """
+        cached = await asyncio.to_thread(cache.load)
+        if cached is None:
+            devices = await self.get_devices()
+            await asyncio.to_thread(cache.save, devices)
+            self.devices = devices
+            for device in devices:
+                self.start_subscribe(device, function)
+            return devices
+
+        version, devices = cached
+        self.devices = devices
+        for device in devices:
+            self.start_subscribe(device, function)
+        self.device_refresh_task = asyncio.create_task(
+            self._refresh_devices_safely(cache, function, version, devices, on_change)
+        )
+        return devices
+
+    async def _refresh_devices_safely(self, cache, function, version, devices, on_change):
+        try:
+            await self.refresh_devices(cache, function, version, devices, on_change)
+        except Exception:
+            _LOGGER.exception("Could not refresh the cached device list.")
+
+    async def refresh_devices(
+        self,
+        cache: DeviceCache,
+        function: Callable,
+        version: str,
+        devices: list[SnooDevice],
+        on_change: Callable[[DeviceChanges, list[SnooDevice]], None] | None = None,
+    ) -> DeviceChanges:
+        """Fetch the device list and only touch subscriptions for devices that changed.
+
+        If the list differs from ``version``, `self.devices` is replaced and ``on_change``
+        is called with the changes and the new list. The changes are empty when only
+        metadata such as a name or firmware version changed.
+        """
+        fresh = await self.get_devices()
+        if devices_version(fresh) == version:
+            return DeviceChanges()
+
+        changes = diff_devices(devices, fresh)
+        for device in changes.removed + changes.moved:
+            _LOGGER.info(f"Device {device.serialNumber} was removed or moved, dropping its subscription.")
+            await self.unsubscribe(device)
+        for device in changes.added + changes.moved:
+            self.start_subscribe(device, function)
+        # Keep the newest metadata (name, firmware, ...) for devices that didn't need reconnecting.
+        for device in fresh:
+            if device.serialNumber in self._mqtt_callbacks:
+                self._mqtt_callbacks[device.serialNumber] = (device, self._mqtt_callbacks[device.serialNumber][1])
+        await asyncio.to_thread(cache.save, fresh)
+        self.devices = fresh
+        if on_change is not None:
+            on_change(changes, fresh)
+        return changes
+
+    async def unsubscribe(self, device: SnooDevice):
+        self._mqtt_callbacks.pop(device.serialNumber, None)
+        task = self._mqtt_tasks.pop(device.serialNumber, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
     def start_subscribe(self, device: SnooDevice, function: Callable):
         if device.serialNumber in self._mqtt_tasks and not self._mqtt_tasks[device.serialNumber].done():
             _LOGGER.warning(f"Subscription task for device {device.serialNumber} is already running.")
@@ -336,6 +483,9 @@ class Snoo:
 
         self._mqtt_tasks[device.serialNumber] = asyncio.create_task(self.subscribe_mqtt(device, function))
 
+    def handle_mqtt_payload(self, payload: str, function: Callable):
+        function(SnooData.from_json(payload))
+
     async def subscribe_mqtt(self, device: SnooDevice, function: Callable):
         host = device.awsIoT.clientEndpoint
         port = 443
@@ -378,8 +528,11 @@ class Snoo:
                 logging.info(f"Subscribed to topic: {topic}")
 
                 async for message in client.messages:
-                    logging.debug(f"Received message on topic '{message.topic}': {message.payload.decode()}")
-                    function(SnooData.from_json(message.payload.decode()))
+                    payload = message.payload.decode()
+                    if self.recorder is not None:
+                        self.recorder.record(RecordSource.MQTT, device.serialNumber, payload)
+                    logging.debug(f"Received message on topic '{message.topic}': {payload}")
+                    self.handle_mqtt_payload(payload, function)
 
         except aiomqtt.MqttError as e:
             logging.error(f"MQTT connection for {device.serialNumber} failed: {e}")